@@ -23,7 +23,9 @@ requires:
 ```
 """
 
+import concurrent.futures
 import logging
+import typing
 
 import ops
 
@@ -35,10 +37,11 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 3
+LIBPATCH = 4
 
 _TUNNEL_TOKEN_SECRET_ID_FIELD = "tunnel_token_secret_id"
 _TUNNEL_TOKEN_SECRET_VALUE_FIELD = "tunnel-token"
+_MAX_TUNNEL_TOKEN_WORKERS = 8
 DEFAULT_CLOUDFLARED_ROUTE_RELATION = "cloudflared-route"
 
 logger = logging.getLogger(__name__)
@@ -57,10 +60,24 @@ class CloudflaredRouteProvider(ops.Object):
         self._charm = charm
         self._relation_name = relation_name
         super().__init__(self._charm, self._relation_name)
+        self._secret_content_cache: dict[str, dict[str, str]] = {}
+        self._relation_cache: ops.Relation | None = None
         self.framework.observe(
             self._charm.on[relation_name].relation_broken, self._on_relation_broken
         )
 
+    def get_relation(self) -> ops.Relation | None:
+        """Get the only existing cloudflared-route relation, cached for the lifetime of the hook.
+
+        Returns:
+            The cloudflared-route relation, or None if the relation doesn't exist.
+        """
+        if self._relation_cache is None:
+            self._relation_cache = self._charm.model.get_relation(
+                relation_name=self._relation_name
+            )
+        return self._relation_cache
+
     def set_tunnel_token(self, tunnel_token: str, relation: ops.Relation | None = None) -> None:
         """Set cloudflared tunnel-token in the integration.
 
@@ -70,18 +87,9 @@ class CloudflaredRouteProvider(ops.Object):
                 only existing cloudflared-route relation.
         """
         if not relation:
-            relation = self._charm.model.get_relation(relation_name=self._relation_name)
+            relation = self.get_relation()
         relation_data = relation.data[self._charm.app]
-        secret_id = relation_data.get(_TUNNEL_TOKEN_SECRET_ID_FIELD)
-        if not secret_id:
-            secret = self._charm.app.add_secret({_TUNNEL_TOKEN_SECRET_VALUE_FIELD: tunnel_token})
-            secret.grant(relation)
-            relation_data[_TUNNEL_TOKEN_SECRET_ID_FIELD] = secret.id
-        else:
-            secret = self._charm.model.get_secret(id=secret_id)
-            content = secret.get_content(refresh=True)
-            if content[_TUNNEL_TOKEN_SECRET_VALUE_FIELD] != tunnel_token:
-                secret.set_content({_TUNNEL_TOKEN_SECRET_VALUE_FIELD: tunnel_token})
+        relation_data.update(self._sync_tunnel_token_secret(tunnel_token, relation))
 
     def unset_tunnel_token(self, relation: ops.Relation | None = None) -> None:
         """Unset cloudflared tunnel-token in the integration.
@@ -91,11 +99,12 @@ class CloudflaredRouteProvider(ops.Object):
                 the only existing cloudflared-route relation.
         """
         if not relation:
-            relation = self._charm.model.get_relation(relation_name=self._relation_name)
+            relation = self.get_relation()
         data = relation.data[self._charm.app]
         secret_id = data.get(_TUNNEL_TOKEN_SECRET_ID_FIELD)
         if secret_id:
             self._charm.model.get_secret(id=secret_id).remove_all_revisions()
+            self._secret_content_cache.pop(secret_id, None)
         data[_TUNNEL_TOKEN_SECRET_VALUE_FIELD] = ""
 
     def set_nameserver(self, nameserver: str | None, relation: ops.Relation | None = None) -> None:
@@ -107,15 +116,76 @@ class CloudflaredRouteProvider(ops.Object):
                 the only existing cloudflared-route relation.
         """
         if not relation:
-            relation = self._charm.model.get_relation(relation_name=self._relation_name)
+            relation = self.get_relation()
         data = relation.data[self._charm.app]
-        if nameserver:
-            data["nameserver"] = nameserver
-        else:
-            del data["nameserver"]
+        data["nameserver"] = nameserver or ""
+
+    def apply(
+        self, tunnel_token: str, nameserver: str | None, relation: ops.Relation | None = None
+    ) -> None:
+        """Set the tunnel-token and set or unset the nameserver in a single relation data write.
+
+        Requires ops 2.20.0 or later, where a relation data update only writes the changed keys
+        with a single relation-set call, and skips the call if nothing changed.
+
+        Args:
+            tunnel_token: The tunnel-token to set.
+            nameserver: The nameserver used by the Cloudflared tunnel.
+            relation: The relation to update, if the relation is None, using the only existing
+                cloudflared-route relation.
+        """
+        if not relation:
+            relation = self.get_relation()
+        relation.data[self._charm.app].update(
+            {
+                **self._sync_tunnel_token_secret(tunnel_token, relation),
+                "nameserver": nameserver or "",
+            }
+        )
+
+    def _sync_tunnel_token_secret(
+        self, tunnel_token: str, relation: ops.Relation
+    ) -> dict[str, str]:
+        """Create or update the tunnel-token secret, granting it to the relation on creation.
+
+        Args:
+            tunnel_token: The tunnel-token to set.
+            relation: The relation the tunnel-token secret is shared with.
+
+        Returns:
+            The relation data fields that need to be updated.
+        """
+        secret_id = relation.data[self._charm.app].get(_TUNNEL_TOKEN_SECRET_ID_FIELD)
+        content = {_TUNNEL_TOKEN_SECRET_VALUE_FIELD: tunnel_token}
+        if not secret_id:
+            secret = self._charm.app.add_secret(content)
+            secret.grant(relation)
+            secret_id = typing.cast(str, secret.id)
+            self._secret_content_cache[secret_id] = content
+            return {_TUNNEL_TOKEN_SECRET_ID_FIELD: secret_id}
+        current_content = self._get_secret_content(secret_id)
+        if current_content[_TUNNEL_TOKEN_SECRET_VALUE_FIELD] != tunnel_token:
+            self._charm.model.get_secret(id=secret_id).set_content(content)
+            self._secret_content_cache.pop(secret_id, None)
+        return {}
+
+    def _get_secret_content(self, secret_id: str) -> dict[str, str]:
+        """Get the content of a secret, cached for the lifetime of the hook.
+
+        Args:
+            secret_id: The ID of the secret.
+
+        Returns:
+            The latest content of the secret.
+        """
+        if secret_id not in self._secret_content_cache:
+            secret = self._charm.model.get_secret(id=secret_id)
+            self._secret_content_cache[secret_id] = secret.get_content(refresh=True)
+        return self._secret_content_cache[secret_id]
 
     def _on_relation_broken(self, event: ops.RelationBrokenEvent):
         self.unset_tunnel_token(event.relation)
+        self._relation_cache = None
 
 
 class CloudflaredRouteRequirer:
@@ -151,6 +221,35 @@ class CloudflaredRouteRequirer:
                 f"secret doesn't have '{_TUNNEL_TOKEN_SECRET_VALUE_FIELD}' field"
             ) from exc
 
+    @classmethod
+    def get_all_tunnel_tokens(
+        cls, charm: ops.CharmBase, relation_name: str = DEFAULT_CLOUDFLARED_ROUTE_RELATION
+    ) -> dict[int, str | None]:
+        """Get cloudflared tunnel-tokens from all cloudflared-route integrations concurrently.
+
+        Args:
+            charm: The requirer charm.
+            relation_name: The cloudflared-route relation name.
+
+        Returns:
+            cloudflared tunnel-tokens keyed by relation ID.
+
+        Raises:
+            InvalidIntegration: any integration contains invalid data
+        """
+        requirer = cls(charm, relation_name)
+        relations = charm.model.relations[relation_name]
+        if not relations:
+            return {}
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(_MAX_TUNNEL_TOKEN_WORKERS, len(relations))
+        ) as executor:
+            tunnel_tokens = executor.map(requirer.get_tunnel_token, relations)
+            return {
+                relation.id: tunnel_token
+                for relation, tunnel_token in zip(relations, tunnel_tokens)
+            }
+
     def get_nameserver(self, relation: ops.Relation) -> str | None:
         """Get the nameserver used by the Cloudflared tunnel.
 
@@ -160,4 +259,4 @@ class CloudflaredRouteRequirer:
         Returns:
             the nameserver used by the Cloudflared tunnel.
         """
-        return relation.data[relation.app].get("nameserver")
+        return relation.data[relation.app].get("nameserver") or None
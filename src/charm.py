@@ -7,6 +7,7 @@
 
 """Cloudflared charm service."""
 
+import hashlib
 import json
 import logging
 import socket
@@ -18,6 +19,10 @@ from charms.traefik_k8s.v2.ingress import IngressPerAppProvider
 
 logger = logging.getLogger(__name__)
 
+# Increment when the integration data written by the charm changes, so that existing deployments
+# rewrite it on the next reconciliation.
+RECONCILE_SCHEMA_VERSION = 1
+
 
 class InvalidConfig(ValueError):
     """Raised when charm config is invalid."""
@@ -26,6 +31,8 @@ class InvalidConfig(ValueError):
 class CloudflareConfiguratorCharm(ops.CharmBase):
     """Cloudflare configurator charm service."""
 
+    _stored = ops.StoredState()
+
     def __init__(self, *args: typing.Any):
         """Construct.
 
@@ -35,14 +42,21 @@ class CloudflareConfiguratorCharm(ops.CharmBase):
         super().__init__(*args)
         self._cloudflare_route = CloudflaredRouteProvider(charm=self)
         self._ingress = IngressPerAppProvider(charm=self)
+        self._stored.set_default(last_reconcile_hash="")
+        self.framework.observe(self.on.upgrade_charm, self._on_upgrade_charm)
         self.framework.observe(self.on.config_changed, self._reconcile)
         self.framework.observe(self.on.secret_changed, self._reconcile)
         self.framework.observe(self._ingress.on.data_provided, self._reconcile)
         self.framework.observe(self.on["cloudflared-route"].relation_changed, self._reconcile)
         self.framework.observe(self.on.get_ingress_data_action, self._on_get_ingress_data_action)
 
-    def _reconcile(self, _: ops.EventBase) -> None:
-        """Handle changed configuration."""
+    def _reconcile(self, event: ops.EventBase) -> None:
+        """Handle changed configuration.
+
+        Args:
+            event: The event triggering the reconciliation.
+        """
+        refresh = isinstance(event, ops.SecretChangedEvent)
         if not self.unit.is_leader():
             self.unit.status = ops.BlockedStatus(
                 "this charm only supports a single unit, please remove the additional units "
@@ -50,30 +64,81 @@ class CloudflareConfiguratorCharm(ops.CharmBase):
             )
             return
         self.unit.status = ops.ActiveStatus()
-        domain = self.config.get("domain")
+        ingress_rels = self._ingress.relations
+        ingress_relation = ingress_rels[0] if ingress_rels else None
+        domain = typing.cast(str | None, self.config.get("domain"))
         try:
-            tunnel_token = self._get_tunnel_tokens()
+            tunnel_token = self._get_tunnel_tokens(refresh=refresh)
         except InvalidConfig as exc:
             self.unit.status = ops.BlockedStatus(str(exc))
             return
         if not (domain and tunnel_token):
-            missing = []
-            if not domain:
-                missing.append("domain")
-            if not tunnel_token:
-                missing.append("tunnel-token")
-            self.unit.status = ops.BlockedStatus(f"waiting for {', '.join(missing)} configuration")
-            self._unpublish_ingress_url()
-            return
-        if relation := self.model.get_relation("cloudflared-route"):
-            self._cloudflare_route.set_tunnel_token(tunnel_token, relation=relation)
-            self._cloudflare_route.set_nameserver(
-                self.config.get("nameserver") or self._get_k8s_dns(), relation=relation
+            missing = ", ".join(
+                name
+                for name, value in (("domain", domain), ("tunnel-token", tunnel_token))
+                if not value
             )
-            if self._ingress.relations:
-                self._ingress.publish_url(self._ingress.relations[0], f"https://{domain}")
+            self.unit.status = ops.BlockedStatus(f"waiting for {missing} configuration")
+            self._unpublish_ingress_url(ingress_relation)
+            self._stored.last_reconcile_hash = ""
+            return
+        relation = self._cloudflare_route.get_relation()
+        nameserver = (
+            typing.cast(str | None, self.config.get("nameserver")) or self._get_k8s_dns()
+            if relation
+            else None
+        )
+        # The tunnel-token content only changes on secret-changed, always reconcile in that case.
+        if not refresh and self._stored.last_reconcile_hash == self._get_reconcile_hash(
+            domain, nameserver, relation, ingress_relation
+        ):
+            logger.debug("reconcile inputs and integration data unchanged, skipping updates")
+            return
+        if relation:
+            self._cloudflare_route.apply(tunnel_token, nameserver, relation=relation)
+            if ingress_relation:
+                self._ingress.publish_url(ingress_relation, f"https://{domain}")
         else:
-            self._unpublish_ingress_url()
+            self._unpublish_ingress_url(ingress_relation)
+        self._stored.last_reconcile_hash = self._get_reconcile_hash(
+            domain, nameserver, relation, ingress_relation
+        )
+
+    def _on_upgrade_charm(self, _: ops.UpgradeCharmEvent) -> None:
+        """Force the next reconciliation to rewrite the integration data."""
+        self._stored.last_reconcile_hash = ""
+
+    def _get_reconcile_hash(
+        self,
+        domain: str,
+        nameserver: str | None,
+        relation: ops.Relation | None,
+        ingress_relation: ops.Relation | None,
+    ) -> str:
+        """Fingerprint the inputs of a reconciliation and the integration data it manages.
+
+        The tunnel-token is identified by its secret ID, the secret content is never hashed.
+
+        Args:
+            domain: The domain charm configuration.
+            nameserver: The nameserver used by the Cloudflared tunnel.
+            relation: The cloudflared-route relation.
+            ingress_relation: The ingress relation.
+
+        Returns:
+            The hex digest of the reconciliation state.
+        """
+        state = (
+            RECONCILE_SCHEMA_VERSION,
+            domain,
+            self.config.get("tunnel-token"),
+            nameserver,
+            *(
+                (rel.id, sorted(rel.data[self.app].items())) if rel else None
+                for rel in (relation, ingress_relation)
+            ),
+        )
+        return hashlib.blake2b(repr(state).encode(), digest_size=16).hexdigest()
 
     def _get_k8s_dns(self) -> str | None:
         """Retrieve the current k8s dns address being used.
@@ -86,14 +151,21 @@ class CloudflareConfiguratorCharm(ops.CharmBase):
         except socket.error:
             return None
 
-    def _unpublish_ingress_url(self) -> None:
-        """Unpublish ingress url."""
-        if self._ingress.relations:
-            self._ingress.wipe_ingress_data(self._ingress.relations[0])
+    def _unpublish_ingress_url(self, ingress_relation: ops.Relation | None) -> None:
+        """Unpublish ingress url.
+
+        Args:
+            ingress_relation: The ingress relation, or None if the relation doesn't exist.
+        """
+        if ingress_relation:
+            self._ingress.wipe_ingress_data(ingress_relation)
 
-    def _get_tunnel_tokens(self) -> str | None:
+    def _get_tunnel_tokens(self, refresh: bool = True) -> str | None:
         """Receive tunnel tokens from charm configuration.
 
+        Args:
+            refresh: Whether to fetch the latest revision of the tunnel-token secret.
+
         Returns:
             Cloudflared tunnel token.
 
@@ -103,7 +175,7 @@ class CloudflareConfiguratorCharm(ops.CharmBase):
         secret_id = typing.cast(str, self.config.get("tunnel-token"))
         if secret_id:
             secret = self.model.get_secret(id=secret_id)
-            secret_value = secret.get_content(refresh=True).get("tunnel-token")
+            secret_value = secret.get_content(refresh=refresh).get("tunnel-token")
             if secret_value is None:
                 raise InvalidConfig(f"missing 'tunnel-token' in juju secret: {secret_id}")
             return secret_value
@@ -115,20 +187,21 @@ class CloudflareConfiguratorCharm(ops.CharmBase):
         Args:
             event: Action event.
         """
-        if not self._ingress.relations:
+        ingress_rels = self._ingress.relations
+        if not ingress_rels:
             event.fail("no ingress relation")
             return
-        relation = self._ingress.relations[0]
+        relation = ingress_rels[0]
         data = self._ingress.get_data(relation)
         event.set_results(
             {
                 "ingress": json.dumps(
                     {
                         "application-data": data.app.model_dump(),
-                        "unit-data": sorted(
-                            [unit.model_dump() for unit in data.units],
-                            key=lambda unit: unit["host"],
-                        ),
+                        "unit-data": [
+                            unit.model_dump()
+                            for unit in sorted(data.units, key=lambda unit: unit.host)
+                        ],
                     }
                 )
             }
@@ -13,6 +13,60 @@ import pytest_asyncio
 from pytest_operator.plugin import OpsTest
 
 PROJECT_BASE = pathlib.Path(__file__).parent.parent.parent.resolve()
+_INGRESS_LIB_SRC = (PROJECT_BASE / "lib/charms/traefik_k8s/v2/ingress.py").read_text()
+_CLOUDFLARED_ROUTE_LIB_SRC = (
+    PROJECT_BASE / "lib/charms/cloudflare_configurator/v0/cloudflared_route.py"
+).read_text()
+_INGRESS_REQUIRER_SRC = textwrap.dedent(
+    """\
+    import ops
+    from ingress import IngressPerAppRequirer
+    from any_charm_base import AnyCharmBase
+
+    class AnyCharm(AnyCharmBase):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.ingress = IngressPerAppRequirer(self, port=8080)
+            self.unit.status = ops.ActiveStatus()
+    """
+)
+_INGRESS_REQUIRER_CONFIG = {
+    "src-overwrite": json.dumps(
+        {"any_charm.py": _INGRESS_REQUIRER_SRC, "ingress.py": _INGRESS_LIB_SRC}
+    ),
+    "python-packages": "pydantic",
+}
+_CLOUDFLARED_ROUTE_REQUIRER_SRC = textwrap.dedent(
+    """\
+    import ops
+    from cloudflared_route import CloudflaredRouteRequirer
+    from any_charm_base import AnyCharmBase
+
+    class AnyCharm(AnyCharmBase):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.cloudflared_route = CloudflaredRouteRequirer(
+                charm=self,
+                relation_name="require-cloudflared-route"
+            )
+            self.unit.status = ops.ActiveStatus()
+
+        def get_tunnel_tokens(self):
+            return list(
+                CloudflaredRouteRequirer.get_all_tunnel_tokens(
+                    charm=self, relation_name="require-cloudflared-route"
+                ).values()
+            )
+    """
+)
+_CLOUDFLARED_ROUTE_REQUIRER_CONFIG = {
+    "src-overwrite": json.dumps(
+        {
+            "any_charm.py": _CLOUDFLARED_ROUTE_REQUIRER_SRC,
+            "cloudflared_route.py": _CLOUDFLARED_ROUTE_LIB_SRC,
+        }
+    ),
+}
 
 
 @pytest.fixture(scope="module")
@@ -39,33 +93,10 @@ async def cloudflare_configurator(
 @pytest_asyncio.fixture(scope="module")
 async def ingress_requirer(ops_test: OpsTest) -> juju.application.Application:
     """Deploy an ingress requirer using any-charm"""
-    ingress_requirer_src = textwrap.dedent(
-        """\
-        import ops
-        from ingress import IngressPerAppRequirer
-        from any_charm_base import AnyCharmBase
-
-        class AnyCharm(AnyCharmBase):
-            def __init__(self, *args, **kwargs):
-                super().__init__(*args, **kwargs)
-                self.ingress = IngressPerAppRequirer(self, port=8080)
-                self.unit.status = ops.ActiveStatus()
-        """
-    )
     return await ops_test.model.deploy(
         "any-charm",
         "ingress-requirer",
-        config={
-            "src-overwrite": json.dumps(
-                {
-                    "any_charm.py": ingress_requirer_src,
-                    "ingress.py": (
-                        PROJECT_BASE / "lib/charms/traefik_k8s/v2/ingress.py"
-                    ).read_text(),
-                }
-            ),
-            "python-packages": "pydantic",
-        },
+        config=_INGRESS_REQUIRER_CONFIG,
         num_units=2,
         channel="latest/edge",
     )
@@ -74,41 +105,10 @@ async def ingress_requirer(ops_test: OpsTest) -> juju.application.Application:
 @pytest_asyncio.fixture(scope="module")
 async def cloudflared_route_requirer(ops_test: OpsTest) -> juju.application.Application:
     """Deploy a cloudflared-route requirer using any-charm."""
-    src = textwrap.dedent(
-        """\
-        import ops
-        from cloudflared_route import CloudflaredRouteRequirer
-        from any_charm_base import AnyCharmBase
-
-        class AnyCharm(AnyCharmBase):
-            def __init__(self, *args, **kwargs):
-                super().__init__(*args, **kwargs)
-                self.cloudflared_route = CloudflaredRouteRequirer(
-                    charm=self,
-                    relation_name="require-cloudflared-route"
-                )
-                self.unit.status = ops.ActiveStatus()
-
-            def get_tunnel_tokens(self):
-                return [
-                    self.cloudflared_route.get_tunnel_token(relation)
-                    for relation in self.model.relations["require-cloudflared-route"]
-                ]
-        """
-    )
     return await ops_test.model.deploy(
         "any-charm",
         "cloudflared-route-requirer",
-        config={
-            "src-overwrite": json.dumps(
-                {
-                    "any_charm.py": src,
-                    "cloudflared_route.py": (
-                        PROJECT_BASE / "lib/charms/cloudflare_configurator/v0/cloudflared_route.py"
-                    ).read_text(),
-                }
-            ),
-        },
+        config=_CLOUDFLARED_ROUTE_REQUIRER_CONFIG,
         num_units=2,
         channel="latest/edge",
     )
@@ -0,0 +1,43 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Fixtures for charm unit tests."""
+
+import ops.testing
+import pytest
+
+from src.charm import CloudflareConfiguratorCharm
+
+
+@pytest.fixture(scope="session", name="charm_class")
+def charm_class_fixture() -> type[CloudflareConfiguratorCharm]:
+    """Charm class under test, imported once when the unit tests are collected."""
+    return CloudflareConfiguratorCharm
+
+
+@pytest.fixture
+def charm_context(charm_class: type[CloudflareConfiguratorCharm]) -> ops.testing.Context:
+    """Testing context for a single unit test."""
+    return ops.testing.Context(charm_class)
+
+
+@pytest.fixture(scope="module", name="tunnel_token_secret")
+def tunnel_token_secret_fixture() -> ops.testing.Secret:
+    """Juju secret containing a valid tunnel-token."""
+    return ops.testing.Secret(tracked_content={"tunnel-token": "foobar"})
+
+
+@pytest.fixture(name="charm_config")
+def charm_config_fixture(tunnel_token_secret: ops.testing.Secret) -> dict[str, str]:
+    """Valid charm configuration."""
+    return {"domain": "example.com", "tunnel-token": tunnel_token_secret.id}
+
+
+@pytest.fixture(name="base_state")
+def base_state_fixture(
+    tunnel_token_secret: ops.testing.Secret, charm_config: dict[str, str]
+) -> ops.testing.State:
+    """Leader state with a valid charm configuration and no integrations."""
+    return ops.testing.State(
+        leader=True, config=charm_config, secrets=[tunnel_token_secret], relations=[]
+    )
@@ -5,284 +5,389 @@
 
 """Unit tests."""
 
+import dataclasses
 import json
+import socket
+import typing
 
 import ops
 import ops.testing
 import pytest
+from charms.cloudflare_configurator.v0.cloudflared_route import CloudflaredRouteProvider
+
+_REMOTE_APP_DATA = {
+    "name": json.dumps("example"),
+    "model": json.dumps("example-model"),
+    "port": json.dumps(8080),
+}
+_REMOTE_UNITS_DATA = {
+    0: {"host": json.dumps("example-host-0"), "ip": json.dumps("10.0.0.1")},
+    1: {"host": json.dumps("example-host-1"), "ip": json.dumps("10.0.0.2")},
+}
+_EXPECTED_INGRESS_DATA = {"url": "https://example.com/"}
+_EXPECTED_ACTION_RESULT = {
+    "application-data": {
+        "model": "example-model",
+        "name": "example",
+        "port": 8080,
+        "redirect_https": False,
+        "scheme": "http",
+        "strip_prefix": False,
+    },
+    "unit-data": [
+        {"host": "example-host-0", "ip": "10.0.0.1"},
+        {"host": "example-host-1", "ip": "10.0.0.2"},
+    ],
+}
+
+
+_INVALID_SECRET = ops.testing.Secret(tracked_content={"foobar": "foobar"})
+_OUTDATED_INGRESS_RELATION = ops.testing.Relation(
+    endpoint="ingress", local_app_data={"ingress": '{"url": "https://outdated.example.com/"}'}
+)
+_CLOUDFLARED_ROUTE_RELATION = ops.testing.Relation(endpoint="cloudflared-route")
+# Changes applied to the base state, a None config value removes that option.
+_CONFIG_CHANGED_SCENARIOS = [
+    pytest.param(
+        {"relations": [_OUTDATED_INGRESS_RELATION, _CLOUDFLARED_ROUTE_RELATION]},
+        ops.testing.ActiveStatus(),
+        _EXPECTED_INGRESS_DATA,
+        id="publish",
+    ),
+    pytest.param(
+        {"relations": [_OUTDATED_INGRESS_RELATION]},
+        ops.testing.ActiveStatus(),
+        None,
+        id="unpublish",
+    ),
+    pytest.param(
+        {"config": {"domain": None}, "relations": [_CLOUDFLARED_ROUTE_RELATION]},
+        ops.testing.BlockedStatus("waiting for domain configuration"),
+        None,
+        id="no-domain",
+    ),
+    pytest.param(
+        {"config": {"tunnel-token": None}, "relations": [_CLOUDFLARED_ROUTE_RELATION]},
+        ops.testing.BlockedStatus("waiting for tunnel-token configuration"),
+        None,
+        id="no-tunnel-token",
+    ),
+    pytest.param(
+        {
+            "config": {"tunnel-token": _INVALID_SECRET.id},
+            "secrets": [_INVALID_SECRET],
+            "relations": [_CLOUDFLARED_ROUTE_RELATION],
+        },
+        ops.testing.BlockedStatus(f"missing 'tunnel-token' in juju secret: {_INVALID_SECRET.id}"),
+        None,
+        id="invalid-tunnel-token",
+    ),
+    pytest.param(
+        {"leader": False},
+        ops.testing.BlockedStatus(
+            "this charm only supports a single unit, please remove the additional units using "
+            "`juju scale-application cloudflare-configurator 1`"
+        ),
+        None,
+        id="non-leader",
+    ),
+]
 
-from src.charm import CloudflareConfiguratorCharm
 
+def _run_config_changed(
+    context: ops.testing.Context, base_state: ops.testing.State, **changes: typing.Any
+) -> ops.testing.State:
+    """Run the config-changed event against the base state updated with the given changes."""
+    return context.run(context.on.config_changed(), dataclasses.replace(base_state, **changes))
 
-def test_cloudflared_route_tunnel_token():
+
+def test_cloudflared_route_tunnel_token(charm_context, base_state):
     """
     arrange: create a scenario with proper config and an integration with a cloudflared-route
         requirer.
     act: run the config-changed event
     assert: tunnel-token should be passed to the cloudflared-route requirer correctly.
     """
-    context = ops.testing.Context(CloudflareConfiguratorCharm)
     cloudflared_route_relation = ops.testing.Relation(endpoint="cloudflared-route")
-    secret = ops.testing.Secret(tracked_content={"tunnel-token": "foobar"})
 
-    out = context.run(
-        context.on.config_changed(),
-        ops.testing.State(
-            leader=True,
-            config={"domain": "example.com", "tunnel-token": secret.id},
-            relations=[cloudflared_route_relation],
-            secrets=[secret],
-        ),
-    )
+    out = _run_config_changed(charm_context, base_state, relations=[cloudflared_route_relation])
 
     local_app_data = out.get_relation(cloudflared_route_relation.id).local_app_data
-    assert (
-        out.get_secret(id=local_app_data["tunnel_token_secret_id"]).tracked_content["tunnel-token"]
-        == "foobar"
-    )
-
-
-def test_publish_ingress_url():
+    secret_id = local_app_data["tunnel_token_secret_id"]
+    assert out.get_secret(id=secret_id).tracked_content["tunnel-token"] == "foobar"
+
+
+@pytest.mark.parametrize(
+    "relations, expected",
+    [
+        pytest.param(
+            [
+                ops.testing.Relation(
+                    endpoint="ingress",
+                    remote_app_data=_REMOTE_APP_DATA,
+                    remote_units_data=_REMOTE_UNITS_DATA,
+                )
+            ],
+            _EXPECTED_ACTION_RESULT,
+            id="with-ingress",
+        ),
+        pytest.param([], ops.testing.ActionFailed, id="no-ingress"),
+    ],
+)
+def test_get_ingress_data_action(charm_context, relations, expected):
     """
-    arrange: create a scenario with proper config and an integration with a ingress requirer.
-    act: run the config-changed event
-    assert: ingress url should be set in the ingress integration.
+    arrange: create a scenario with or without an integration with a ingress requirer.
+    act: run the get-ingress-data action
+    assert: get-ingress-data action should dump all ingress integration data, or fail if there's
+        no ingress integration.
     """
-    context = ops.testing.Context(CloudflareConfiguratorCharm)
-    ingress_relation = ops.testing.Relation(endpoint="ingress")
-    cloudflared_route_relation = ops.testing.Relation(endpoint="cloudflared-route")
-    secret = ops.testing.Secret(tracked_content={"tunnel-token": "foobar"})
+    state = ops.testing.State(relations=relations)
 
-    out = context.run(
-        context.on.config_changed(),
-        ops.testing.State(
-            leader=True,
-            config={"domain": "example.com", "tunnel-token": secret.id},
-            relations=[ingress_relation, cloudflared_route_relation],
-            secrets=[secret],
-        ),
-    )
+    if isinstance(expected, type) and issubclass(expected, BaseException):
+        with pytest.raises(expected):
+            charm_context.run(charm_context.on.action("get-ingress-data"), state)
+        return
+    charm_context.run(charm_context.on.action("get-ingress-data"), state)
 
-    assert (
-        out.get_relation(ingress_relation.id).local_app_data["ingress"]
-        == '{"url": "https://example.com/"}'
-    )
+    assert json.loads(charm_context.action_results["ingress"]) == expected
 
 
-def test_get_ingress_data_action():
+@pytest.mark.parametrize("changes, expected_status, expected_ingress", _CONFIG_CHANGED_SCENARIOS)
+def test_config_changed(charm_context, base_state, changes, expected_status, expected_ingress):
     """
-    arrange: create a scenario with proper config and an integration with a ingress requirer.
-    act: run the get-ingress-data action
-    assert: get-ingress-data action should dump all ingress integration data.
+    arrange: create a scenario by applying the given changes to a leader with a valid charm
+        config, where the ingress integration holds an outdated ingress url.
+    act: run the config-changed event
+    assert: the unit status and the published ingress data should match the expected ones.
     """
-    context = ops.testing.Context(CloudflareConfiguratorCharm)
-    ingress_relation = ops.testing.Relation(
-        endpoint="ingress",
-        remote_app_data={
-            "name": json.dumps("example"),
-            "model": json.dumps("example-model"),
-            "port": json.dumps(8080),
-        },
-        remote_units_data={
-            0: {"host": json.dumps("example-host-0"), "ip": json.dumps("10.0.0.1")},
-            1: {"host": json.dumps("example-host-1"), "ip": json.dumps("10.0.0.2")},
+    config = {**base_state.config, **changes.get("config", {})}
+    out = _run_config_changed(
+        charm_context,
+        base_state,
+        **{
+            **changes,
+            "config": {key: value for key, value in config.items() if value is not None},
         },
     )
 
-    context.run(
-        context.on.action("get-ingress-data"), ops.testing.State(relations=[ingress_relation])
+    assert out.unit_status == expected_status
+    ingress = next(
+        (rel.local_app_data.get("ingress") for rel in out.relations if rel.endpoint == "ingress"),
+        None,
     )
+    assert (json.loads(ingress) if ingress else None) == expected_ingress
 
-    assert json.loads(context.action_results.get("ingress")) == {
-        "application-data": {
-            "model": "example-model",
-            "name": "example",
-            "port": 8080,
-            "redirect_https": False,
-            "scheme": "http",
-            "strip_prefix": False,
-        },
-        "unit-data": [
-            {"host": "example-host-0", "ip": "10.0.0.1"},
-            {"host": "example-host-1", "ip": "10.0.0.2"},
-        ],
-    }
 
-
-def test_get_ingress_data_action_no_ingress():
+def test_set_nameserver(charm_context, base_state):
     """
-    arrange: create a scenario without integration with ingress requirer.
-    act: run the get-ingress-data action
-    assert: get-ingress-data action should fail.
+    arrange: create a scenario with the `nameserver` charm config.
+    act: run the config-changed event
+    assert: nameserver should be set in the cloudflared-route integration.
     """
-    context = ops.testing.Context(CloudflareConfiguratorCharm)
+    ingress_relation = ops.testing.Relation(endpoint="ingress")
+    cloudflared_route_relation = ops.testing.Relation(endpoint="cloudflared-route")
 
-    with pytest.raises(ops.testing.ActionFailed):
-        context.run(context.on.action("get-ingress-data"), ops.testing.State())
+    out = _run_config_changed(
+        charm_context,
+        base_state,
+        relations=[ingress_relation, cloudflared_route_relation],
+        config={**base_state.config, "nameserver": "1.2.3.4"},
+    )
+    local_app_data = out.get_relation(cloudflared_route_relation.id).local_app_data
+    assert local_app_data["nameserver"] == "1.2.3.4"
 
 
-def test_non_leader():
+def test_unset_nameserver(charm_context, base_state, monkeypatch):
     """
-    arrange: create a scenario where the charm unit is not the leader.
+    arrange: create a scenario without the `nameserver` charm config and an unresolvable
+        kube-dns.
     act: run the config-changed event
-    assert: charm should enter the blocked state.
+    assert: nameserver should not exist in the cloudflared-route integration.
     """
-    context = ops.testing.Context(CloudflareConfiguratorCharm)
 
-    out = context.run(context.on.config_changed(), ops.testing.State(leader=False))
+    def gethostbyname(_):
+        raise socket.gaierror
+
+    monkeypatch.setattr("socket.gethostbyname", gethostbyname)
+    ingress_relation = ops.testing.Relation(endpoint="ingress")
+
+    cloudflared_route_relation = ops.testing.Relation(
+        endpoint="cloudflared-route",
+        local_app_data={"nameserver": "1.2.3.4"},
+    )
 
-    assert out.unit_status == ops.testing.BlockedStatus(
-        "this charm only supports a single unit, please remove the additional units using "
-        "`juju scale-application cloudflare-configurator 1`"
+    out = _run_config_changed(
+        charm_context, base_state, relations=[ingress_relation, cloudflared_route_relation]
     )
 
+    local_app_data = out.get_relation(cloudflared_route_relation.id).local_app_data
+    assert "nameserver" not in local_app_data
+
 
-def test_no_domain_config():
+def test_update_cloudflared_route_tunnel_token(charm_context, base_state):
     """
-    arrange: create a scenario without the `domain` charm config.
+    arrange: create a scenario with an existing cloudflared-route tunnel-token secret holding an
+        outdated tunnel-token.
     act: run the config-changed event
-    assert: charm should enter the blocked state.
+    assert: the existing tunnel-token secret should be updated with the new tunnel-token.
     """
-    context = ops.testing.Context(CloudflareConfiguratorCharm)
-    cloudflared_route_relation = ops.testing.Relation(endpoint="cloudflared-route")
-    secret = ops.testing.Secret(tracked_content={"tunnel-token": "foobar"})
-    config = {"tunnel-token": secret.id}
+    route_secret = ops.testing.Secret(tracked_content={"tunnel-token": "outdated"}, owner="app")
+    cloudflared_route_relation = ops.testing.Relation(
+        endpoint="cloudflared-route",
+        local_app_data={"tunnel_token_secret_id": route_secret.id},
+    )
 
-    out = context.run(
-        context.on.config_changed(),
-        ops.testing.State(
-            leader=True,
-            config=config,
-            relations=[cloudflared_route_relation],
-            secrets=[secret],
-        ),
+    out = _run_config_changed(
+        charm_context,
+        base_state,
+        relations=[cloudflared_route_relation],
+        secrets=[*base_state.secrets, route_secret],
     )
 
-    assert out.unit_status == ops.testing.BlockedStatus("waiting for domain configuration")
+    assert out.get_secret(id=route_secret.id).latest_content == {"tunnel-token": "foobar"}
 
 
-def test_no_tunnel_token_config():
+def test_k8s_dns_nameserver(charm_context, base_state, monkeypatch):
     """
-    arrange: create a scenario without the `tunnel-token` charm config.
+    arrange: create a scenario without the `nameserver` charm config and a resolvable kube-dns.
     act: run the config-changed event
-    assert: charm should enter the blocked state.
+    assert: the kube-dns address should be set as the nameserver in the cloudflared-route
+        integration.
     """
-    context = ops.testing.Context(CloudflareConfiguratorCharm)
+    monkeypatch.setattr("socket.gethostbyname", lambda _: "10.152.183.10")
     cloudflared_route_relation = ops.testing.Relation(endpoint="cloudflared-route")
-    config = {"domain": "example.com"}
 
-    out = context.run(
-        context.on.config_changed(),
-        ops.testing.State(
-            leader=True,
-            config=config,
-            relations=[cloudflared_route_relation],
-        ),
-    )
+    out = _run_config_changed(charm_context, base_state, relations=[cloudflared_route_relation])
 
-    assert out.unit_status == ops.testing.BlockedStatus("waiting for tunnel-token configuration")
+    local_app_data = out.get_relation(cloudflared_route_relation.id).local_app_data
+    assert local_app_data["nameserver"] == "10.152.183.10"
 
 
-def test_unpublish_ingress_url():
+def test_reconcile_unchanged(charm_context, base_state, monkeypatch):
     """
-    arrange: create a scenario without the integration with cloudflared-route requirer.
-    act: run the config-changed event
-    assert: ingress url should be removed from the ingress integration.
+    arrange: create a scenario with proper config and an integration with a cloudflared-route
+        requirer, and run the config-changed event once.
+    act: run the config-changed event again without changing anything.
+    assert: the cloudflared-route integration should only be updated by the first run.
     """
-    context = ops.testing.Context(CloudflareConfiguratorCharm)
-    secret = ops.testing.Secret(tracked_content={"tunnel-token": "foobar"})
-    config = {"domain": "example.com", "tunnel-token": secret.id}
-    ingress_relation = ops.testing.Relation(
-        endpoint="ingress", local_app_data={"ingress": '{"url": "https://example.com/"}'}
+    calls = []
+    monkeypatch.setattr(
+        CloudflaredRouteProvider, "apply", lambda _, *args, **kwargs: calls.append(args)
     )
-
-    out = context.run(
-        context.on.config_changed(),
-        ops.testing.State(
-            leader=True,
-            config=config,
-            secrets=[secret],
-            relations=[ingress_relation],
-        ),
+    cloudflared_route_relation = ops.testing.Relation(endpoint="cloudflared-route")
+    state = dataclasses.replace(
+        base_state,
+        config={**base_state.config, "nameserver": "1.2.3.4"},
+        relations=[cloudflared_route_relation],
     )
 
-    assert not out.get_relation(ingress_relation.id).local_app_data.get("ingress")
+    out = charm_context.run(charm_context.on.config_changed(), state)
+    out = charm_context.run(charm_context.on.config_changed(), out)
+
+    assert calls == [("foobar", "1.2.3.4")]
+    assert out.unit_status == ops.testing.ActiveStatus()
 
 
-def test_invalid_tunnel_token_config():
+def test_rotate_tunnel_token(charm_context):
     """
-    arrange: create a scenario with an invalid tunnel-token configuration.
-    act: run the config-changed event
-    assert: charm should enter the blocked state.
+    arrange: create a scenario where the tunnel-token secret has a new revision.
+    act: run the secret-changed event
+    assert: the latest tunnel-token should be passed to the cloudflared-route requirer.
     """
-    context = ops.testing.Context(CloudflareConfiguratorCharm)
     cloudflared_route_relation = ops.testing.Relation(endpoint="cloudflared-route")
-    secret = ops.testing.Secret(tracked_content={"foobar": "foobar"})
-    config = {"domain": "example.com", "tunnel-token": secret.id}
+    secret = ops.testing.Secret(
+        tracked_content={"tunnel-token": "foobar"}, latest_content={"tunnel-token": "rotated"}
+    )
 
-    out = context.run(
-        context.on.config_changed(),
+    out = charm_context.run(
+        charm_context.on.secret_changed(secret),
         ops.testing.State(
             leader=True,
-            config=config,
-            secrets=[secret],
+            config={"domain": "example.com", "tunnel-token": secret.id},
             relations=[cloudflared_route_relation],
+            secrets=[secret],
         ),
     )
 
-    assert out.unit_status == ops.testing.BlockedStatus(
-        f"missing 'tunnel-token' in juju secret: {secret.id}"
-    )
+    local_app_data = out.get_relation(cloudflared_route_relation.id).local_app_data
+    secret_id = local_app_data["tunnel_token_secret_id"]
+    assert out.get_secret(id=secret_id).tracked_content["tunnel-token"] == "rotated"
 
 
-def test_set_nameserver():
+def test_switch_tunnel_token_back(charm_context, base_state):
     """
-    arrange: create a scenario with the `nameserver` charm config.
-    act: run the config-changed event
-    assert: nameserver should be set in the cloudflared-route integration.
+    arrange: create a scenario with an integration with a cloudflared-route requirer and two
+        tunnel-token secrets.
+    act: run the config-changed event while switching the tunnel-token config from the first
+        secret to the second one and back.
+    assert: the cloudflared-route tunnel-token secret should hold the first tunnel-token again.
     """
-    context = ops.testing.Context(CloudflareConfiguratorCharm)
-    ingress_relation = ops.testing.Relation(endpoint="ingress")
+    first_secret = ops.testing.Secret(tracked_content={"tunnel-token": "first"})
+    second_secret = ops.testing.Secret(tracked_content={"tunnel-token": "second"})
     cloudflared_route_relation = ops.testing.Relation(endpoint="cloudflared-route")
-    secret = ops.testing.Secret(tracked_content={"tunnel-token": "foobar"})
+    state = dataclasses.replace(
+        base_state,
+        config={"domain": "example.com", "tunnel-token": first_secret.id},
+        relations=[cloudflared_route_relation],
+        secrets=[first_secret, second_secret],
+    )
 
-    out = context.run(
-        context.on.config_changed(),
-        ops.testing.State(
-            leader=True,
-            config={"domain": "example.com", "tunnel-token": secret.id, "nameserver": "1.2.3.4"},
-            relations=[ingress_relation, cloudflared_route_relation],
-            secrets=[secret],
-        ),
+    out = charm_context.run(charm_context.on.config_changed(), state)
+    out = charm_context.run(
+        charm_context.on.config_changed(),
+        dataclasses.replace(out, config={**out.config, "tunnel-token": second_secret.id}),
     )
+    out = charm_context.run(
+        charm_context.on.config_changed(),
+        dataclasses.replace(out, config={**out.config, "tunnel-token": first_secret.id}),
+    )
+
     local_app_data = out.get_relation(cloudflared_route_relation.id).local_app_data
-    assert local_app_data["nameserver"] == "1.2.3.4"
+    secret_id = local_app_data["tunnel_token_secret_id"]
+    assert out.get_secret(id=secret_id).latest_content == {"tunnel-token": "first"}
 
 
-def test_unset_nameserver():
+def test_reconcile_repairs_drifted_data(charm_context, base_state):
     """
-    arrange: create a scenario without the `nameserver` charm config.
-    act: run the config-changed event
-    assert: nameserver should not exist in the ingress integration.
+    arrange: create a scenario with an integration with a cloudflared-route requirer, run the
+        config-changed event once, then wipe the charm's cloudflared-route integration data.
+    act: run the config-changed event again without changing the charm configuration.
+    assert: the cloudflared-route integration data should be written again.
     """
-    context = ops.testing.Context(CloudflareConfiguratorCharm)
-    ingress_relation = ops.testing.Relation(endpoint="ingress")
-    secret = ops.testing.Secret(tracked_content={"tunnel-token": "foobar"})
+    cloudflared_route_relation = ops.testing.Relation(endpoint="cloudflared-route")
+    out = _run_config_changed(charm_context, base_state, relations=[cloudflared_route_relation])
 
-    cloudflared_route_relation = ops.testing.Relation(
-        endpoint="cloudflared-route",
-        local_app_data={"nameserver": "1.2.3.4"},
+    out = _run_config_changed(
+        charm_context,
+        out,
+        relations=[dataclasses.replace(cloudflared_route_relation, local_app_data={})],
     )
 
-    out = context.run(
-        context.on.config_changed(),
-        ops.testing.State(
-            leader=True,
-            config={"domain": "example.com", "tunnel-token": secret.id},
-            relations=[ingress_relation, cloudflared_route_relation],
-            secrets=[secret],
-        ),
+    local_app_data = out.get_relation(cloudflared_route_relation.id).local_app_data
+    secret_id = local_app_data["tunnel_token_secret_id"]
+    assert out.get_secret(id=secret_id).tracked_content["tunnel-token"] == "foobar"
+
+
+def test_reconcile_after_upgrade(charm_context, base_state, monkeypatch):
+    """
+    arrange: create a scenario with proper config and an integration with a cloudflared-route
+        requirer, and run the config-changed event once.
+    act: run the upgrade-charm event, then the config-changed event without changing anything.
+    assert: the cloudflared-route integration should be updated again after the upgrade.
+    """
+    calls = []
+    monkeypatch.setattr(
+        CloudflaredRouteProvider, "apply", lambda _, *args, **kwargs: calls.append(args)
+    )
+    cloudflared_route_relation = ops.testing.Relation(endpoint="cloudflared-route")
+    state = dataclasses.replace(
+        base_state,
+        config={**base_state.config, "nameserver": "1.2.3.4"},
+        relations=[cloudflared_route_relation],
     )
 
-    local_app_data = out.get_relation(ingress_relation.id).local_app_data
-    assert "nameserver" not in local_app_data
+    out = charm_context.run(charm_context.on.config_changed(), state)
+    out = charm_context.run(charm_context.on.upgrade_charm(), out)
+    out = charm_context.run(charm_context.on.config_changed(), out)
+
+    assert calls == [("foobar", "1.2.3.4"), ("foobar", "1.2.3.4")]
@@ -0,0 +1,253 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+# pylint: disable=missing-function-docstring
+
+"""Unit tests for the cloudflared-route charm library."""
+
+import typing
+
+import ops
+import ops.testing
+import pytest
+from charms.cloudflare_configurator.v0.cloudflared_route import (
+    CloudflaredRouteProvider,
+    CloudflaredRouteRequirer,
+    InvalidIntegration,
+)
+
+_PROVIDER_META = {
+    "name": "cloudflare-configurator",
+    "provides": {"cloudflared-route": {"interface": "cloudflared-route"}},
+}
+_REQUIRER_META = {
+    "name": "cloudflared",
+    "requires": {"cloudflared-route": {"interface": "cloudflared-route"}},
+}
+
+
+class _ProviderCharm(ops.CharmBase):
+    """Minimal charm providing the cloudflared-route integration."""
+
+    def __init__(self, *args: typing.Any):
+        super().__init__(*args)
+        self.cloudflared_route = CloudflaredRouteProvider(self)
+
+
+class _RequirerCharm(ops.CharmBase):
+    """Minimal charm requiring the cloudflared-route integration."""
+
+
+@pytest.fixture(name="provider_context")
+def provider_context_fixture() -> ops.testing.Context:
+    """Testing context for the cloudflared-route provider charm."""
+    return ops.testing.Context(_ProviderCharm, meta=_PROVIDER_META)
+
+
+@pytest.fixture(name="requirer_context")
+def requirer_context_fixture() -> ops.testing.Context:
+    """Testing context for the cloudflared-route requirer charm."""
+    return ops.testing.Context(_RequirerCharm, meta=_REQUIRER_META)
+
+
+@pytest.fixture(name="relation_set_calls")
+def relation_set_calls_fixture(monkeypatch: pytest.MonkeyPatch) -> list[dict[str, str]]:
+    """Record the data of every relation-set call."""
+    # ops has no public hook into the relation-set calls made by the model backend
+    # pylint: disable=protected-access
+    calls: list[dict[str, str]] = []
+    update_relation_data = ops.model._ModelBackend.update_relation_data
+
+    def record_update_relation_data(self, relation_id, entity, data, **kwargs):
+        calls.append(dict(data))
+        update_relation_data(self, relation_id, entity, data, **kwargs)
+
+    monkeypatch.setattr(
+        ops.model._ModelBackend, "update_relation_data", record_update_relation_data
+    )
+    return calls
+
+
+def _get_all_tunnel_tokens(
+    context: ops.testing.Context, state: ops.testing.State
+) -> dict[int, str | None]:
+    """Get the tunnel-tokens from all cloudflared-route integrations in the given state."""
+    with context(context.on.update_status(), state) as manager:
+        return CloudflaredRouteRequirer.get_all_tunnel_tokens(manager.charm)
+
+
+def test_get_all_tunnel_tokens(requirer_context):
+    """
+    arrange: create cloudflared-route integrations sharing different tunnel-token secrets.
+    act: get all tunnel-tokens.
+    assert: every tunnel-token is returned keyed by its relation ID.
+    """
+    secrets = [
+        ops.testing.Secret(tracked_content={"tunnel-token": f"token-{i}"}) for i in range(3)
+    ]
+    relations = [
+        ops.testing.Relation(
+            endpoint="cloudflared-route",
+            remote_app_data={"tunnel_token_secret_id": secret.id},
+        )
+        for secret in secrets
+    ]
+    state = ops.testing.State(secrets=secrets, relations=relations)
+
+    assert _get_all_tunnel_tokens(requirer_context, state) == {
+        relation.id: f"token-{i}" for i, relation in enumerate(relations)
+    }
+
+
+def test_get_all_tunnel_tokens_without_secret_id(requirer_context):
+    """
+    arrange: create one cloudflared-route integration with a tunnel-token and one without.
+    act: get all tunnel-tokens.
+    assert: the integration without a tunnel-token secret maps to None.
+    """
+    secret = ops.testing.Secret(tracked_content={"tunnel-token": "foobar"})
+    relation = ops.testing.Relation(
+        endpoint="cloudflared-route", remote_app_data={"tunnel_token_secret_id": secret.id}
+    )
+    empty_relation = ops.testing.Relation(endpoint="cloudflared-route")
+    state = ops.testing.State(secrets=[secret], relations=[relation, empty_relation])
+
+    assert _get_all_tunnel_tokens(requirer_context, state) == {
+        relation.id: "foobar",
+        empty_relation.id: None,
+    }
+
+
+def test_get_all_tunnel_tokens_invalid_integration(requirer_context):
+    """
+    arrange: create a cloudflared-route integration sharing a secret without a tunnel-token.
+    act: get all tunnel-tokens.
+    assert: InvalidIntegration is raised to the caller.
+    """
+    secret = ops.testing.Secret(tracked_content={"foo": "bar"})
+    relation = ops.testing.Relation(
+        endpoint="cloudflared-route", remote_app_data={"tunnel_token_secret_id": secret.id}
+    )
+    state = ops.testing.State(secrets=[secret], relations=[relation])
+
+    with pytest.raises(InvalidIntegration):
+        _get_all_tunnel_tokens(requirer_context, state)
+
+
+@pytest.mark.parametrize(
+    "remote_app_data, expected",
+    [
+        pytest.param({"nameserver": "10.0.0.10"}, "10.0.0.10", id="set"),
+        pytest.param({"nameserver": ""}, None, id="empty"),
+        pytest.param({}, None, id="missing"),
+    ],
+)
+def test_get_nameserver(requirer_context, remote_app_data, expected):
+    """
+    arrange: create a cloudflared-route integration with a set, empty or missing nameserver.
+    act: get the nameserver.
+    assert: the nameserver is returned, or None if it's empty or missing.
+    """
+    relation = ops.testing.Relation(endpoint="cloudflared-route", remote_app_data=remote_app_data)
+    state = ops.testing.State(relations=[relation])
+
+    with requirer_context(requirer_context.on.update_status(), state) as manager:
+        requirer = CloudflaredRouteRequirer(manager.charm)
+        nameserver = requirer.get_nameserver(manager.charm.model.get_relation("cloudflared-route"))
+
+    assert nameserver == expected
+
+
+def _run_provider(
+    context: ops.testing.Context,
+    state: ops.testing.State,
+    action: typing.Callable[[CloudflaredRouteProvider], None],
+) -> ops.testing.State:
+    """Run the given action against the provider charm and return the output state."""
+    with context(context.on.update_status(), state) as manager:
+        action(manager.charm.cloudflared_route)
+        return manager.run()
+
+
+def test_apply_initial(provider_context, relation_set_calls):
+    """
+    arrange: create an empty cloudflared-route integration.
+    act: apply a tunnel-token and a nameserver.
+    assert: the secret ID and the nameserver are written in a single relation-set call.
+    """
+    relation = ops.testing.Relation(endpoint="cloudflared-route")
+    state = ops.testing.State(leader=True, relations=[relation])
+
+    out = _run_provider(
+        provider_context, state, lambda provider: provider.apply("foobar", "10.0.0.10")
+    )
+
+    data = out.get_relation(relation.id).local_app_data
+    secret = out.get_secret(id=data["tunnel_token_secret_id"])
+    assert secret.latest_content == {"tunnel-token": "foobar"}
+    assert relation_set_calls == [{"tunnel_token_secret_id": secret.id, "nameserver": "10.0.0.10"}]
+
+
+def test_apply_unchanged(provider_context, relation_set_calls):
+    """
+    arrange: create a cloudflared-route integration already holding the tunnel-token and
+        nameserver.
+    act: apply the same tunnel-token and nameserver.
+    assert: relation-set is not called.
+    """
+    secret = ops.testing.Secret(tracked_content={"tunnel-token": "foobar"}, owner="app")
+    relation = ops.testing.Relation(
+        endpoint="cloudflared-route",
+        local_app_data={"tunnel_token_secret_id": secret.id, "nameserver": "10.0.0.10"},
+    )
+    state = ops.testing.State(leader=True, secrets=[secret], relations=[relation])
+
+    out = _run_provider(
+        provider_context, state, lambda provider: provider.apply("foobar", "10.0.0.10")
+    )
+
+    assert not relation_set_calls
+    assert out.get_relation(relation.id).local_app_data == relation.local_app_data
+
+
+def test_set_tunnel_token(provider_context):
+    """
+    arrange: create a cloudflared-route integration already holding a tunnel-token secret.
+    act: set a different tunnel-token.
+    assert: the secret content is updated and the secret ID is kept.
+    """
+    secret = ops.testing.Secret(tracked_content={"tunnel-token": "foobar"}, owner="app")
+    relation = ops.testing.Relation(
+        endpoint="cloudflared-route", local_app_data={"tunnel_token_secret_id": secret.id}
+    )
+    state = ops.testing.State(leader=True, secrets=[secret], relations=[relation])
+
+    out = _run_provider(provider_context, state, lambda provider: provider.set_tunnel_token("baz"))
+
+    assert out.get_relation(relation.id).local_app_data == relation.local_app_data
+    assert out.get_secret(id=secret.id).latest_content == {"tunnel-token": "baz"}
+
+
+@pytest.mark.parametrize(
+    "nameserver, expected_data",
+    [
+        pytest.param("10.0.0.10", {"nameserver": "10.0.0.10"}, id="set"),
+        pytest.param(None, {}, id="unset"),
+    ],
+)
+def test_set_nameserver(provider_context, nameserver, expected_data):
+    """
+    arrange: create a cloudflared-route integration holding a nameserver.
+    act: set or unset the nameserver.
+    assert: the nameserver in the relation data is updated.
+    """
+    relation = ops.testing.Relation(
+        endpoint="cloudflared-route", local_app_data={"nameserver": "10.0.0.1"}
+    )
+    state = ops.testing.State(leader=True, relations=[relation])
+
+    out = _run_provider(
+        provider_context, state, lambda provider: provider.set_nameserver(nameserver)
+    )
+
+    assert out.get_relation(relation.id).local_app_data == expected_data